@@ -2,21 +2,97 @@
 Модуль детектора людей на основе Ultralytics YOLOv8 (предобученные веса).
 Возвращает список словарей с bbox, conf и классом.
 """
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import torch
 import ultralytics.nn.tasks
 torch.serialization.add_safe_globals([
     ultralytics.nn.tasks.DetectionModel
 ])
 import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
 
 try:
     from ultralytics import YOLO
+    from ultralytics.nn.autobackend import AutoBackend
+    from ultralytics.utils import ops
 except Exception:
     YOLO = None
     logging.warning("Ultralytics YOLO не доступен. Убедитесь, что пакет установлен.")
 
+try:
+    from ultralytics.utils.nms import non_max_suppression
+except Exception:
+    # в старых версиях Ultralytics NMS лежит в ops
+    non_max_suppression = ops.non_max_suppression if YOLO is not None else None
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+    logging.warning("onnxruntime не доступен, на CPU используется PyTorch.")
+
+import cv2
 import numpy as np
+import torch.nn.functional as F
+
+# Параметры по умолчанию, как у предиктора Ultralytics
+IMGSZ = 640
+# Шаг сетки модели: letterbox дополняет кадр только до кратного STRIDE (как LetterBox(auto=True))
+STRIDE = 32
+CONF_THRES = 0.25
+IOU_THRES = 0.7
+MAX_DET = 300
+# Сколько пачек одного потока может одновременно находиться на GPU (см. PeopleDetector.submit)
+GPU_SLOTS = 2
+# Провайдеры ONNX Runtime для CPU в порядке предпочтения
+ONNX_PROVIDERS = ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+
+
+def letterbox_geometry(h: int, w: int) -> Tuple[int, int, int, int, int, int]:
+    """
+    Геометрия letterbox кадра h x w с теми же округлениями, что и в Ultralytics:
+    масштаб до IMGSZ по длинной стороне и дополнение до кратного STRIDE.
+
+    :return: (new_h, new_w, top, bottom, left, right)
+    """
+    gain = min(IMGSZ / h, IMGSZ / w)
+    new_h, new_w = round(h * gain), round(w * gain)
+    pad_h = math.ceil(new_h / STRIDE) * STRIDE - new_h
+    pad_w = math.ceil(new_w / STRIDE) * STRIDE - new_w
+    top = round(pad_h / 2 - 0.1)
+    left = round(pad_w / 2 - 0.1)
+    return new_h, new_w, top, pad_h - top, left, pad_w - left
+
+
+class _GpuSlot:
+    """
+    Слот GPU-пути: CUDA-поток, постоянные буферы пачки, событие окончания её обработки
+    и, для TensorRT, собственный контекст исполнения движка с выходными буферами.
+    """
+
+    def __init__(self, device: torch.device):
+        self.stream = torch.cuda.Stream(device)
+        self.done = torch.cuda.Event()
+        self.host = None
+        self.dev = None
+        self.context = None
+        self.outputs: Dict[str, torch.Tensor] = {}
+        self.input_shape = None
+
+
+class _PendingBatch:
+    """Пачка, запущенная на GPU и ещё не забранная через PeopleDetector.collect()."""
+
+    def __init__(self, slot: _GpuSlot, im: torch.Tensor, preds, orig_shape: Tuple[int, int]):
+        self.slot = slot
+        # вход держим до collect(): движок читает его асинхронно
+        self.im = im
+        self.preds = preds
+        self.orig_shape = orig_shape
 
 
 class PeopleDetector:
@@ -24,18 +100,137 @@ class PeopleDetector:
     Детектор людей. Оборачивает модель YOLO.
     """
 
-    def __init__(self, model_name: str = "yolov8n.pt"):
+    def __init__(self, model_name: str = "yolov8n.pt", batch_size: int = 16,
+                 use_tensorrt: bool = True, int8: bool = False,
+                 calib_data: Optional[str] = None, gpu_preprocess: bool = True,
+                 use_onnxruntime: bool = True):
         """
         Загружает модель.
+
+        При наличии CUDA веса один раз экспортируются в TensorRT-движок (FP16,
+        либо INT8 с калибровкой) рядом с исходным файлом, и дальше используется
+        он. Если экспорт невозможен (нет GPU или пакета tensorrt) — работаем на PyTorch.
+
+        На GPU кадры пачки загружаются на устройство один раз (uint8), а letterbox,
+        BGR->RGB и нормализация выполняются там же, минуя NumPy-препроцессинг Ultralytics.
+
+        Без CUDA веса один раз экспортируются в ONNX и запускаются через ONNX Runtime
+        (OpenVINO, если установлен, иначе CPU-провайдер).
+
+        :param model_name: путь/имя весов YOLO (.pt)
+        :param batch_size: максимальный размер пачки для TensorRT-движка
+        :param use_tensorrt: пытаться ли использовать TensorRT
+        :param int8: квантовать движок в INT8 (нужен calib_data); при ошибке — FP16
+        :param calib_data: yaml датасета с кадрами для INT8-калибровки
+        :param gpu_preprocess: готовить вход модели на GPU (только при наличии CUDA)
+        :param use_onnxruntime: использовать ONNX Runtime (только без CUDA)
         """
         if YOLO is None:
             raise RuntimeError("Ultralytics YOLO не найден в окружении.")
+        # Детектор может быть общим для нескольких конвейеров (потоков):
+        # у каждого потока свои слоты (CUDA-потоки, буферы и контексты TensorRT), поэтому
+        # движок исполняет пачки конвейеров параллельно; сериализуется только вызов
+        # общей модели PyTorch (или общего контекста TensorRT, если свои создать не удалось)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.weights = model_name
+        self.batch_size = batch_size
+        if use_tensorrt and torch.cuda.is_available():
+            if int8:
+                try:
+                    self.weights = self._load_tensorrt(model_name, batch_size, True, calib_data)
+                except Exception:
+                    logging.exception("Не удалось подготовить INT8-движок, пробуем FP16.")
+            if self.weights == model_name:
+                try:
+                    self.weights = self._load_tensorrt(model_name, batch_size)
+                except Exception:
+                    logging.exception("Не удалось подготовить TensorRT-движок, используем PyTorch.")
         try:
-            self.model = YOLO(model_name)
+            self.model = YOLO(self.weights, task="detect")
         except Exception as e:
-            logging.exception("Не удалось загрузить модель %s: %s", model_name, e)
+            logging.exception("Не удалось загрузить модель %s: %s", self.weights, e)
             raise
 
+        # Прямой доступ к бэкенду для входа, подготовленного на GPU
+        self.device = None
+        self.backend = None
+        if gpu_preprocess and torch.cuda.is_available():
+            try:
+                self.device = torch.device("cuda:0")
+                self.backend = AutoBackend(self.weights, device=self.device, fp16=True, verbose=False)
+                self.backend.eval()
+                # TensorRT запускается не через бэкенд, а в контексте слота (см. _infer_engine)
+                self._is_engine = str(self.weights).endswith(".engine")
+                # False, если свои контексты создать не удалось — тогда общий синхронный бэкенд
+                self._engine_async = self._is_engine
+            except Exception:
+                logging.exception("Не удалось подготовить GPU-препроцессинг, используем Ultralytics.")
+                self.device = None
+                self.backend = None
+
+        # CPU: ONNX Runtime вместо PyTorch
+        self.session = None
+        if use_onnxruntime and ort is not None and not torch.cuda.is_available():
+            try:
+                self.session = self._load_onnx(model_name)
+                self.input_name = self.session.get_inputs()[0].name
+            except Exception:
+                logging.exception("Не удалось подготовить ONNX Runtime, используем PyTorch.")
+                self.session = None
+
+    @staticmethod
+    def _load_onnx(model_name: str):
+        """
+        Создаёт сессию ONNX Runtime, при отсутствии .onnx — экспортирует его из весов.
+        """
+        onnx_path = os.path.splitext(model_name)[0] + ".onnx"
+        if not os.path.exists(onnx_path):
+            logging.info("Экспорт %s в ONNX (однократно)...", model_name)
+            onnx_path = YOLO(model_name).export(format="onnx", opset=13, dynamic=True, imgsz=IMGSZ)
+        available = ort.get_available_providers()
+        providers = [p for p in ONNX_PROVIDERS if p in available]
+        logging.info("ONNX Runtime: %s, провайдеры %s", onnx_path, providers)
+        return ort.InferenceSession(onnx_path, providers=providers)
+
+    @staticmethod
+    def _load_tensorrt(model_name: str, batch_size: int, int8: bool = False,
+                       calib_data: Optional[str] = None) -> str:
+        """
+        Находит TensorRT-движок (FP16 или INT8), при отсутствии — экспортирует его из весов.
+
+        :return: путь к .engine
+        """
+        if int8 and not calib_data:
+            raise ValueError("Для INT8-экспорта нужен calib_data.")
+        base = os.path.splitext(model_name)[0]
+        engine_path = base + ("_int8" if int8 else "") + ".engine"
+        if not os.path.exists(engine_path):
+            if int8:
+                logging.info("Экспорт %s в TensorRT INT8 (однократно, калибровка %s)...",
+                             model_name, calib_data)
+                # Ultralytics всегда пишет <base>.engine рядом с весами — экспортируем
+                # из копии весов во временной папке, чтобы не затереть FP16-движок
+                weights = model_name if os.path.exists(model_name) else YOLO(model_name).ckpt_path
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    tmp_weights = os.path.join(tmp_dir, os.path.basename(weights))
+                    shutil.copy(weights, tmp_weights)
+                    exported = YOLO(tmp_weights).export(
+                        format="engine", int8=True, data=calib_data, dynamic=True,
+                        batch=batch_size, imgsz=IMGSZ, device=0
+                    )
+                    shutil.move(exported, engine_path)
+            else:
+                logging.info("Экспорт %s в TensorRT FP16 (однократно)...", model_name)
+                exported = YOLO(model_name).export(
+                    format="engine", half=True, dynamic=True,
+                    batch=batch_size, imgsz=IMGSZ, device=0
+                )
+                if os.path.abspath(exported) != os.path.abspath(engine_path):
+                    os.replace(exported, engine_path)
+        logging.info("Используется TensorRT-движок: %s", engine_path)
+        return engine_path
+
     def detect(self, frame) -> List[Dict]:
         """
         Выполняет детекцию на одном кадре.
@@ -47,30 +242,285 @@ class PeopleDetector:
             "class": "person"
         }
         """
-        results = self.model(frame)  # возможное место исключения
-        detections = []
+        return self.detect_batch([frame])[0]
 
-        # results[0].boxes содержит список боксов
-        try:
-            boxes = results[0].boxes
-            for box in boxes:
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """
+        Выполняет детекцию на пачке кадров одним вызовом модели.
+
+        :param frames: список изображений в BGR (numpy array)
+        :return: список детекций для каждого кадра (в том же порядке),
+            формат детекций как в detect()
+        """
+        return self.collect(self.submit(frames))
+
+    def submit(self, frames: List[np.ndarray]):
+        """
+        Запускает детекцию пачки и возвращает дескриптор для collect().
+
+        На GPU загрузка, препроцессинг и инференс (и PyTorch, и TensorRT через
+        execute_async в контексте слота) только ставятся в очередь CUDA-потока слота,
+        так что пока GPU считает эту пачку, вызывающий может разбирать предыдущую.
+        У каждого потока GPU_SLOTS слотов: одновременно в работе не больше GPU_SLOTS
+        пачек, и каждую нужно забрать через collect() до следующих GPU_SLOTS вызовов submit().
+        На CPU детекция выполняется сразу, дескриптор — готовый результат.
+
+        :param frames: список изображений в BGR (numpy array)
+        """
+        if not frames:
+            return []
+        if self.backend is not None:
+            return self._submit_gpu(frames)
+        if self.session is not None:
+            return self._detect_batch_onnx(frames)
+        with self._lock:
+            results = self.model(frames)  # возможное место исключения
+        return [self._parse_result(res) for res in results]
+
+    def collect(self, handle) -> List[List[Dict]]:
+        """
+        Дожидается пачки, запущенной submit(), и возвращает её детекции
+        (формат как в detect_batch()).
+        """
+        if isinstance(handle, _PendingBatch):
+            return self._collect_gpu(handle)
+        return handle
+
+    def _gpu_slots(self) -> threading.local:
+        """
+        Состояние GPU-пути текущего потока: GPU_SLOTS слотов, у каждого свой CUDA-поток
+        и постоянные буферы пачки (pinned на хосте и на GPU), выделяемые под размер кадра.
+        Слоты используются по кругу.
+        """
+        state = self._local
+        if not hasattr(state, "slots"):
+            state.slots = [_GpuSlot(self.device) for _ in range(GPU_SLOTS)]
+            state.next_slot = 0
+        return state
+
+    def _upload(self, frames: List[np.ndarray], slot: "_GpuSlot") -> torch.Tensor:
+        """
+        Загружает пачку кадров (uint8, NHWC) на GPU в CUDA-потоке слота.
+
+        Кадры пишутся прямо в постоянный pinned-буфер и копируются в постоянный
+        буфер на GPU асинхронно, без выделения памяти на каждую пачку.
+
+        :return: view буфера на GPU (N, H, W, 3)
+        """
+        n = len(frames)
+        shape = (max(n, self.batch_size),) + frames[0].shape
+        if slot.host is None or slot.host.shape[1:] != shape[1:] or slot.host.shape[0] < n:
+            slot.host = torch.empty(shape, dtype=torch.uint8, pin_memory=True)
+            slot.dev = torch.empty(shape, dtype=torch.uint8, device=self.device)
+        np.stack(frames, out=slot.host.numpy()[:n])
+        with torch.cuda.stream(slot.stream):
+            slot.dev[:n].copy_(slot.host[:n], non_blocking=True)
+        return slot.dev[:n]
+
+    def _preprocess_gpu(self, batch: torch.Tensor) -> torch.Tensor:
+        """
+        Готовит вход модели на GPU: letterbox (см. letterbox_geometry), BGR->RGB, [0, 1].
+
+        :param batch: кадры на GPU, uint8 (N, H, W, 3) BGR
+        :return: тензор (N, 3, H', W'), стороны кратны STRIDE и не больше IMGSZ
+        """
+        h, w = batch.shape[1:3]
+        im = batch.permute(0, 3, 1, 2).flip(1)  # NHWC BGR -> NCHW RGB
+        im = im.half() if self.backend.fp16 else im.float()
+        im /= 255.0
+
+        # letterbox до кратного STRIDE, а не до полного квадрата IMGSZ x IMGSZ
+        new_h, new_w, top, bottom, left, right = letterbox_geometry(h, w)
+        if (new_h, new_w) != (h, w):
+            im = F.interpolate(im, size=(new_h, new_w), mode="bilinear", align_corners=False)
+        im = F.pad(im, (left, right, top, bottom), value=114 / 255.0)
+        return im.contiguous()
+
+    def _engine_context(self, slot: _GpuSlot, shape: Tuple[int, ...]):
+        """
+        Контекст исполнения TensorRT слота (создаётся при первом вызове) с входом формы shape.
+
+        У каждого слота свой контекст и свои выходные буферы: пачки разных слотов
+        и разных конвейеров исполняются движком одновременно, без общей блокировки.
+        При смене формы входа выходные буферы выделяются заново.
+        """
+        engine = self.backend.model
+        trt10 = not hasattr(engine, "num_bindings")
+        if slot.context is None:
+            with self._lock, torch.cuda.device(self.device):
+                slot.context = engine.create_execution_context()
+        if slot.input_shape != shape:
+            ctx = slot.context
+            if trt10:
+                ok = ctx.set_input_shape("images", shape)
+            else:
+                ok = ctx.set_binding_shape(engine.get_binding_index("images"), shape)
+            if not ok:
+                raise ValueError(f"Вход {shape} вне профиля оптимизации TensorRT-движка.")
+            slot.outputs = {}
+            for name in self.backend.output_names:
+                out_shape = (ctx.get_tensor_shape(name) if trt10
+                             else ctx.get_binding_shape(engine.get_binding_index(name)))
+                slot.outputs[name] = torch.empty(tuple(out_shape), device=self.device,
+                                                 dtype=self.backend.bindings[name].data.dtype)
+            slot.input_shape = shape
+        return slot.context
+
+    def _infer_engine(self, im: torch.Tensor, slot: _GpuSlot) -> List[torch.Tensor]:
+        """
+        Ставит инференс TensorRT в очередь CUDA-потока слота (execute_async_v3/v2)
+        в его собственном контексте; выходы — буферы слота.
+        """
+        engine = self.backend.model
+        ctx = self._engine_context(slot, tuple(im.shape))
+        if not hasattr(engine, "num_bindings"):
+            ctx.set_tensor_address("images", im.data_ptr())
+            for name, out in slot.outputs.items():
+                ctx.set_tensor_address(name, out.data_ptr())
+            ok = ctx.execute_async_v3(slot.stream.cuda_stream)
+        else:
+            addrs = [0] * engine.num_bindings
+            addrs[engine.get_binding_index("images")] = im.data_ptr()
+            for name, out in slot.outputs.items():
+                addrs[engine.get_binding_index(name)] = out.data_ptr()
+            ok = ctx.execute_async_v2(addrs, slot.stream.cuda_stream)
+        if not ok:
+            raise RuntimeError("Ошибка запуска TensorRT-движка.")
+        return [slot.outputs[name] for name in sorted(slot.outputs)]
+
+    @torch.inference_mode()
+    def _submit_gpu(self, frames: List[np.ndarray]) -> "_PendingBatch":
+        """
+        Ставит в очередь CUDA-потока очередного слота загрузку, препроцессинг и инференс пачки.
+
+        Перед повторным использованием слота дожидаемся его прошлой пачки: её буферы
+        ещё могут читаться. Загрузка и вычисления идут в одном потоке слота — перекрытие
+        даёт второй слот: пока считается одна пачка, в другом потоке грузится следующая.
+        TensorRT исполняется асинхронно в контексте слота; модель PyTorch общая,
+        её вызов сериализуется блокировкой.
+        """
+        state = self._gpu_slots()
+        slot = state.slots[state.next_slot]
+        state.next_slot = (state.next_slot + 1) % len(state.slots)
+        slot.done.synchronize()
+
+        batch = self._upload(frames, slot)
+        with torch.cuda.stream(slot.stream):
+            im = self._preprocess_gpu(batch)
+            if self._engine_async:
                 try:
-                    cls_id = int(box.cls)
-                    # В COCO класс 'person' обычно id == 0
-                    if cls_id != 0:
-                        continue
-                    xyxy = box.xyxy[0] if hasattr(box, "xyxy") else box.xyxy
-                    x1, y1, x2, y2 = map(int, xyxy)
-                    conf = float(box.conf) if hasattr(box, "conf") else float(box.confidence)
-                    detections.append({
-                        "bbox": (x1, y1, x2, y2),
-                        "conf": conf,
-                        "class": "person",
-                        "center": ((x1 + x2) // 2, (y1 + y2) // 2)
-                    })
+                    preds = self._infer_engine(im, slot)
+                    return _PendingBatch(slot, im, preds, frames[0].shape[:2])
                 except Exception:
-                    logging.exception("Ошибка парсинга бокса детекции.")
+                    logging.exception("Не удалось запустить TensorRT в контексте слота, "
+                                      "используем общий синхронный бэкенд.")
+                    self._engine_async = False
+            if self._is_engine:
+                # execute_v2 синхронный и не ждёт наш CUDA-поток; ждём вход до блокировки,
+                # чтобы загрузка одного конвейера не задерживала инференс остальных
+                slot.stream.synchronize()
+            with self._lock:
+                preds = self.backend(im)
+                if self._is_engine:
+                    # выходные буферы общего контекста перезапишет следующий вызов — копируем их
+                    preds = preds[0] if isinstance(preds, (list, tuple)) else preds
+                    preds = preds.clone()
+                    slot.stream.synchronize()
+        return _PendingBatch(slot, im, preds, frames[0].shape[:2])
+
+    @torch.inference_mode()
+    def _collect_gpu(self, pending: "_PendingBatch") -> List[List[Dict]]:
+        """
+        NMS и масштабирование боксов пачки в CUDA-потоке её слота; результаты всех
+        кадров копируются обратно одним асинхронным копированием.
+        """
+        slot = pending.slot
+        with torch.cuda.stream(slot.stream):
+            # В COCO класс 'person' обычно id == 0
+            dets = non_max_suppression(pending.preds, CONF_THRES, IOU_THRES,
+                                       classes=[0], max_det=MAX_DET)
+            counts = [len(det) for det in dets]
+            det_all = torch.cat(dets)
+            det_all[:, :4] = ops.scale_boxes(pending.im.shape[2:], det_all[:, :4], pending.orig_shape)
+            det_host = det_all.to("cpu", non_blocking=True)
+            slot.done.record(slot.stream)
+        slot.done.synchronize()
+
+        det_host = det_host.numpy()
+        batch_detections = []
+        start = 0
+        for count in counts:
+            batch_detections.append(self._parse_boxes(det_host[start:start + count]))
+            start += count
+        return batch_detections
+
+    @staticmethod
+    def _letterbox(frame: np.ndarray) -> np.ndarray:
+        """Letterbox кадра (см. letterbox_geometry): стороны кратны STRIDE и не больше IMGSZ."""
+        h, w = frame.shape[:2]
+        new_h, new_w, top, bottom, left, right = letterbox_geometry(h, w)
+        if (new_h, new_w) != (h, w):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        return cv2.copyMakeBorder(frame, top, bottom, left, right,
+                                  cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+    def _detect_batch_onnx(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """Детекция пачки через ONNX Runtime с NumPy-препроцессингом и NMS OpenCV."""
+        orig_shape = frames[0].shape[:2]
+        im = np.stack([self._letterbox(frame) for frame in frames])
+        im = np.ascontiguousarray(im[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+        im /= 255.0
+        # выход YOLOv8: (N, 4 + num_classes, num_anchors) с боксами [cx, cy, w, h]
+        preds = self.session.run(None, {self.input_name: im})[0]
+
+        batch_detections = []
+        for pred in preds:
+            pred = pred.T
+            scores = pred[:, 4:]
+            # как в NMS Ultralytics с classes=[0]: бокс — человек, если это его лучший класс
+            keep = (scores.argmax(axis=1) == 0) & (scores[:, 0] > CONF_THRES)
+            cxcywh = pred[keep, :4]
+            conf = scores[keep, 0]
+            xywh = np.column_stack([cxcywh[:, :2] - cxcywh[:, 2:] / 2, cxcywh[:, 2:]])
+            idx = cv2.dnn.NMSBoxes(xywh.tolist(), conf.tolist(), CONF_THRES, IOU_THRES)
+            idx = np.asarray(idx, dtype=np.int64).reshape(-1)[:MAX_DET]
+
+            det = np.zeros((len(idx), 6), dtype=np.float32)
+            det[:, :2] = xywh[idx, :2]
+            det[:, 2:4] = xywh[idx, :2] + xywh[idx, 2:]
+            det[:, 4] = conf[idx]
+            det[:, :4] = ops.scale_boxes(im.shape[2:], det[:, :4], orig_shape)
+            batch_detections.append(self._parse_boxes(det))
+        return batch_detections
+
+    @staticmethod
+    def _parse_boxes(det: np.ndarray) -> List[Dict]:
+        """
+        Переводит массив боксов (N, 6) [x1, y1, x2, y2, conf, cls] в список детекций людей.
+
+        Фильтрация по классу, приведение к int и центры считаются векторно.
+        """
+        # В COCO класс 'person' обычно id == 0
+        det = det[det[:, 5] == 0]
+        xyxy = det[:, :4].astype(np.int32)
+        centers = (xyxy[:, :2] + xyxy[:, 2:]) // 2
+        return [
+            {
+                "bbox": tuple(bbox),
+                "conf": conf,
+                "class": "person",
+                "center": tuple(center)
+            }
+            for bbox, center, conf in zip(xyxy.tolist(), centers.tolist(), det[:, 4].tolist())
+        ]
+
+    @classmethod
+    def _parse_result(cls, result) -> List[Dict]:
+        """Разбирает результат модели для одного кадра в список детекций людей."""
+        # result.boxes.data — тензор (N, 6) [x1, y1, x2, y2, conf, cls]; забираем его с GPU целиком
+        try:
+            data = result.boxes.data.cpu().numpy()
+            return cls._parse_boxes(data[:, [0, 1, 2, 3, -2, -1]])
         except Exception:
             logging.exception("Ошибка обработки результатов модели.")
-        return detections
-    
\ No newline at end of file
+            return []
@@ -4,29 +4,49 @@
 
 Запуск (локально):
 python main.py
+python main.py a.mp4 b.mp4   # несколько видео из input параллельно
 
 В контейнере путь тот же: /app/input/crowd.mp4 -> /app/output/detected_crowd.mp4
 """
 import logging
 import os
-from typing import List, Dict
+import queue
+import sys
+import threading
+from typing import List, Dict, Optional
 
 import cv2
+import torch
 
 from detector import PeopleDetector
 from tracker import PeopleTracker
 from utils import draw_tracked_boxes
+from video_writer import FFmpegVideoWriter, encoder_available
 
 # Настройка логов
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
+    format="%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s"
 )
 
 INPUT_DIR = "/app/input"
 OUTPUT_DIR = "/app/output"
 INPUT_VIDEO = "crowd.mp4"
-OUTPUT_VIDEO = "detected_crowd.mp4"
+# Результат для <имя>.mp4 пишется в OUTPUT_DIR/detected_<имя>.mp4
+OUTPUT_PREFIX = "detected_"
+# Сколько кадров копим перед одним вызовом детектора
+BATCH_SIZE = 16
+# Детектор запускается на каждом DETECT_STRIDE-м кадре, между ними — только предсказание Калмана
+DETECT_STRIDE = 3
+# INT8-квантование TensorRT-движка (только при наличии CUDA); по умолчанию FP16.
+# Калибровка идёт по первым кадрам видео без разметки — включать, проверив качество
+USE_INT8 = False
+CALIB_DIR = "/app/calib"
+CALIB_FRAMES = 200
+# Кодировщики ffmpeg в порядке предпочтения (каждый проверяется перед использованием)
+FFMPEG_CODECS = ["h264_nvenc", "libx264"]
+# Размер очередей между потоками чтения, обработки и записи
+QUEUE_SIZE = 32
 
 
 def ensure_dirs():
@@ -39,19 +59,187 @@ def ensure_dirs():
         raise
 
 
-def main():
-    """Главный цикл обработки: загрузка модели, чтение кадров, детекция, трекинг, запись."""
-    ensure_dirs()
-    input_path = os.path.join(INPUT_DIR, INPUT_VIDEO)
-    output_path = os.path.join(OUTPUT_DIR, OUTPUT_VIDEO)
+def build_calib(input_path: str, calib_dir: str = CALIB_DIR,
+                max_frames: int = CALIB_FRAMES) -> str:
+    """
+    Готовит датасет для INT8-калибровки из первых кадров входного видео.
+
+    Кадры сохраняются в calib_dir/images, рядом пишется calib.yaml в формате
+    датасета Ultralytics. Если yaml уже есть — ничего не пересобирается.
+
+    :return: путь к calib.yaml
+    """
+    yaml_path = os.path.join(calib_dir, "calib.yaml")
+    if os.path.exists(yaml_path):
+        return yaml_path
+
+    images_dir = os.path.join(calib_dir, "images")
+    os.makedirs(images_dir, exist_ok=True)
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Не удалось открыть видео для калибровки: {input_path}")
+    saved = 0
+    try:
+        while saved < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            cv2.imwrite(os.path.join(images_dir, f"{saved:05d}.jpg"), frame)
+            saved += 1
+    finally:
+        cap.release()
+    if saved == 0:
+        raise RuntimeError(f"Во входном видео нет кадров для калибровки: {input_path}")
+
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        f.write(f"path: {calib_dir}\n"
+                "train: images\n"
+                "val: images\n"
+                "names:\n"
+                "  0: person\n")
+    logging.info("Калибровочный датасет: %d кадров в %s", saved, calib_dir)
+    return yaml_path
+
+
+def open_writer(output_path: str, fps: float, width: int, height: int):
+    """
+    Открывает писатель видео: H.264 через ffmpeg первым рабочим кодировщиком
+    из FFMPEG_CODECS (NVENC, затем libx264); если ни один не работает — cv2.VideoWriter с mp4v.
+    """
+    for codec in FFMPEG_CODECS:
+        if not encoder_available(codec):
+            logging.info("Кодировщик ffmpeg %s недоступен.", codec)
+            continue
+        try:
+            out = FFmpegVideoWriter(output_path, fps, width, height, codec=codec)
+            if out.isOpened():
+                logging.info("Запись видео через ffmpeg (%s)", codec)
+                return out
+            out.release()
+        except Exception:
+            logging.exception("Не удалось запустить ffmpeg с %s.", codec)
+    logging.info("Запись видео через cv2.VideoWriter (mp4v)")
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    return cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+
+
+def read_frames(cap, read_q: queue.Queue, stop: threading.Event) -> None:
+    """
+    Поток чтения: декодирует кадры и кладёт (idx, frame) в read_q.
+    По окончании видео (или при остановке) кладёт None.
+    """
+    frame_idx = 0
+    try:
+        while not stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_idx += 1
+            if not _put(read_q, (frame_idx, frame), stop):
+                break
+    except Exception:
+        logging.exception("Ошибка чтения кадра %d", frame_idx + 1)
+    finally:
+        _put(read_q, None, stop)
+
+
+def write_frames(out, write_q: queue.Queue) -> None:
+    """Поток записи: забирает (idx, frame) из write_q и пишет в видео до получения None."""
+    while True:
+        item = write_q.get()
+        if item is None:
+            break
+        frame_idx, frame = item
+        try:
+            out.write(frame)
+        except Exception:
+            logging.exception("Не удалось записать кадр %d в выходное видео", frame_idx)
 
-    # Инициализация детектора и трекера
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Кладёт элемент в ограниченную очередь, не зависая навсегда после stop."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def submit_batch(frames: List, first_idx: int, detector: PeopleDetector) -> Dict:
+    """
+    Запускает детектор одним вызовом на кадрах пачки, на которых он положен
+    (каждый DETECT_STRIDE-й). На GPU вызов не ждёт результата: пока считается
+    эта пачка, можно трекать и рисовать предыдущую (см. finish_batch).
+
+    :param frames: список кадров BGR (numpy array)
+    :param first_idx: номер первого кадра пачки (нумерация с 1)
+    :return: пачка для finish_batch
+    """
+    detect_offsets = [offset for offset in range(len(frames))
+                      if (first_idx + offset - 1) % DETECT_STRIDE == 0]
     try:
-        detector = PeopleDetector()  # может бросить исключение при загрузке весов
-        tracker = PeopleTracker()
+        handle = detector.submit([frames[o] for o in detect_offsets])
     except Exception:
-        logging.exception("Ошибка при инициализации детектора/трекера.")
-        return
+        logging.exception("Ошибка при детекции на кадрах %d-%d",
+                          first_idx, first_idx + len(frames) - 1)
+        handle = [[] for _ in detect_offsets]
+    return {"frames": frames, "first_idx": first_idx,
+            "detect_offsets": detect_offsets, "handle": handle}
+
+
+def finish_batch(batch: Dict, detector: PeopleDetector, tracker: PeopleTracker,
+                 write_q: queue.Queue) -> None:
+    """
+    Забирает детекции пачки, запущенной submit_batch, затем по порядку выполняет
+    трекинг и отрисовку каждого кадра и отдаёт его в поток записи.
+    """
+    frames = batch["frames"]
+    first_idx = batch["first_idx"]
+    detect_offsets = batch["detect_offsets"]
+
+    # Детекция
+    try:
+        batch_detections = detector.collect(batch["handle"])
+    except Exception:
+        logging.exception("Ошибка при детекции на кадрах %d-%d",
+                          first_idx, first_idx + len(frames) - 1)
+        batch_detections = [[] for _ in detect_offsets]
+    detections_by_offset = dict(zip(detect_offsets, batch_detections))
+
+    for offset, frame in enumerate(frames):
+        frame_idx = first_idx + offset
+
+        # Трекер (предсказание + обновление, либо только предсказание между детекциями)
+        try:
+            if offset in detections_by_offset:
+                tracks = tracker.update(detections_by_offset[offset])
+            else:
+                tracks = tracker.predict_only()
+        except Exception:
+            logging.exception("Ошибка в трекере на кадре %d", frame_idx)
+            tracks = []
+
+        # Отрисовка
+        try:
+            draw_tracked_boxes(frame, tracks)
+        except Exception:
+            logging.exception("Ошибка при отрисовке на кадре %d", frame_idx)
+
+        # Запись кадра (в отдельном потоке)
+        write_q.put((frame_idx, frame))
+
+
+def run_pipeline(input_path: str, output_path: str, detector: PeopleDetector,
+                 stop: threading.Event) -> None:
+    """
+    Обрабатывает одно видео: поток чтения -> детекция/трекинг/отрисовка -> поток записи.
+    У каждого видео свой трекер; детектор может быть общим для нескольких конвейеров.
+
+    :param stop: событие остановки конвейера (выставляется и по его завершении)
+    """
+    tracker = PeopleTracker()
 
     # Открываем видео
     try:
@@ -59,6 +247,8 @@ def main():
         if not cap.isOpened():
             logging.error("Не удалось открыть входное видео: %s", input_path)
             return
+        # Внутренний буфер захвата не нужен: кадры и так копятся в очереди чтения
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -67,10 +257,9 @@ def main():
         logging.exception("Ошибка при открытии видео.")
         return
 
-    # Подготовка писателя видео — используем mp4v
+    # Подготовка писателя видео
     try:
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        out = open_writer(output_path, fps, width, height)
         if not out.isOpened():
             logging.error("Не удалось создать VideoWriter для: %s", output_path)
             cap.release()
@@ -80,49 +269,119 @@ def main():
         cap.release()
         return
 
+    # Конвейер: поток чтения -> детекция/трекинг/отрисовка -> поток записи
+    name = os.path.basename(input_path)
+    read_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    write_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    reader = threading.Thread(target=read_frames, args=(cap, read_q, stop),
+                              name=f"reader-{name}", daemon=True)
+    writer = threading.Thread(target=write_frames, args=(out, write_q),
+                              name=f"writer-{name}", daemon=True)
+    reader.start()
+    writer.start()
+
     frame_idx = 0
+    buffer: List = []
+    # Пачка, отправленная в детектор и ещё не обработанная трекером: следующая пачка
+    # отправляется до её разбора, чтобы GPU считал, пока трекер и отрисовка работают на CPU
+    pending = None
     try:
         logging.info("Начинаем обработку: %s -> %s", input_path, output_path)
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+        while not stop.is_set():
+            try:
+                item = read_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                # Дообрабатываем неполную последнюю пачку
+                if buffer:
+                    submitted = submit_batch(buffer, frame_idx - len(buffer) + 1, detector)
+                    if pending is not None:
+                        finish_batch(pending, detector, tracker, write_q)
+                    pending = submitted
+                if pending is not None:
+                    finish_batch(pending, detector, tracker, write_q)
                 logging.info("Видео закончено, обработано кадров: %d", frame_idx)
                 break
 
-            frame_idx += 1
-            # Детекция
-            try:
-                detections = detector.detect(frame)
-            except Exception:
-                logging.exception("Ошибка при детекции на кадре %d", frame_idx)
-                detections = []
+            frame_idx, frame = item
+            buffer.append(frame)
+            # BATCH_SIZE кадров для детектора на пачку
+            if len(buffer) >= BATCH_SIZE * DETECT_STRIDE:
+                submitted = submit_batch(buffer, frame_idx - len(buffer) + 1, detector)
+                if pending is not None:
+                    finish_batch(pending, detector, tracker, write_q)
+                pending = submitted
+                buffer = []
+    finally:
+        stop.set()
+        reader.join()
+        # Дописываем всё, что уже в очереди, и останавливаем поток записи
+        write_q.put(None)
+        writer.join()
+        cap.release()
+        out.release()
+        logging.info("Ресурсы освобождены. Выходной файл: %s", output_path)
 
-            # Трекер (предсказание + обновление)
-            try:
-                tracks = tracker.update(detections)
-            except Exception:
-                logging.exception("Ошибка в трекере на кадре %d", frame_idx)
-                tracks = []
 
-            # Отрисовка
-            try:
-                draw_tracked_boxes(frame, tracks)
-            except Exception:
-                logging.exception("Ошибка при отрисовке на кадре %d", frame_idx)
+def main(input_names: Optional[List[str]] = None):
+    """
+    Главный цикл обработки: загрузка модели, затем по конвейеру на каждое входное видео
+    (чтение кадров, детекция, трекинг, запись). Несколько видео обрабатываются
+    параллельно в отдельных потоках с общим детектором.
 
-            # Запись кадра
-            try:
-                out.write(frame)
-            except Exception:
-                logging.exception("Не удалось записать кадр %d в выходное видео", frame_idx)
+    :param input_names: имена видео в INPUT_DIR (по умолчанию [INPUT_VIDEO])
+    """
+    ensure_dirs()
+    input_names = input_names or [INPUT_VIDEO]
+    input_paths = [os.path.join(INPUT_DIR, name) for name in input_names]
+    output_paths = [os.path.join(OUTPUT_DIR, OUTPUT_PREFIX + os.path.basename(name))
+                    for name in input_names]
+    # Выходной файл называется по имени входного без папки: одинаковые имена
+    # из разных папок писали бы в один файл одновременно
+    if len(set(output_paths)) != len(output_paths):
+        logging.error("У входных видео совпадают имена файлов, выходные файлы перезаписали бы "
+                      "друг друга: %s", ", ".join(input_names))
+        return
 
+    # Калибровочные кадры нужны только для INT8-движка на GPU
+    calib_data = None
+    int8 = USE_INT8 and torch.cuda.is_available()
+    if int8:
+        try:
+            calib_data = build_calib(input_paths[0])
+        except Exception:
+            logging.exception("Не удалось подготовить калибровку INT8, используем FP16.")
+            int8 = False
+
+    # Инициализация детектора
+    try:
+        # может бросить исключение при загрузке весов
+        detector = PeopleDetector(batch_size=BATCH_SIZE, int8=int8, calib_data=calib_data)
+    except Exception:
+        logging.exception("Ошибка при инициализации детектора.")
+        return
+
+    stops = [threading.Event() for _ in input_paths]
+    workers = [
+        threading.Thread(target=run_pipeline, args=(input_path, output_path, detector, stop),
+                         name=os.path.basename(input_path), daemon=True)
+        for input_path, output_path, stop in zip(input_paths, output_paths, stops)
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        # join с таймаутом, чтобы главный поток получал KeyboardInterrupt
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=0.5)
     except KeyboardInterrupt:
         logging.info("Прервано пользователем.")
-    finally:
-        cap.release()
-        out.release()
-        logging.info("Ресурсы освобождены. Выходной файл: %s", output_path)
+        for stop in stops:
+            stop.set()
+        for worker in workers:
+            worker.join()
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
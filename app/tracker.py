@@ -2,80 +2,166 @@
 Трекер с простым сопоставлением и фильтром Калмана.
 
 Логика:
-- каждая траектория имеет KalmanFilter с состоянием [cx, cy, vx, vy]
-- на каждом кадре: predict() для всех треков
+- состояния фильтра Калмана всех треков хранятся в трекере массивами:
+  X (T, 4) с [cx, cy, vx, vy] и ковариации P (T, 4, 4); строка i — трек self.tracks[i]
+- на каждом кадре: один predict для всех треков (ядра фильтра скомпилированы numba)
+- на кадрах без детекции (predict_only) и для несопоставленных треков bbox
+  сдвигаются к предсказанным центрам
 - сопоставление: ближайший центр (евклид) с порогом (max_distance)
-- обновление matched треков, создание новых для unmatched детекций
-- удаление старых треков по счетчику missed_frames
+- один update для всех matched треков, создание новых для unmatched детекций
+- удаление старых треков по счетчику missed_frames (считаются все кадры без
+  сопоставленной детекции, в т.ч. кадры без детекции, поэтому время жизни трека
+  в кадрах не зависит от шага детекции)
 """
-import math
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
 import numpy as np
-from filterpy.kalman import KalmanFilter
 
-_TRACK_ID = 1
+try:
+    from numba import njit
+except Exception:
+    logging.warning("numba не доступен, фильтр Калмана работает без JIT.")
+
+    def njit(*args, **kwargs):
+        """Заглушка njit: возвращает функцию без компиляции."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Модель постоянной скорости: состояние [cx, cy, vx, vy], измерение [cx, cy]
+_F = np.array([[1., 0., 1., 0.],
+               [0., 1., 0., 1.],
+               [0., 0., 1., 0.],
+               [0., 0., 0., 1.]])
+_H = np.array([[1., 0., 0., 0.],
+               [0., 1., 0., 0.]])
+_Q = np.eye(4) * 0.01
+_R = np.eye(2) * 5.0
+_P0 = np.eye(4) * 100.0
+
+
+@njit(cache=True)
+def kf_predict(X: np.ndarray, P: np.ndarray, F: np.ndarray, Q: np.ndarray):
+    """
+    Шаг predict фильтра Калмана сразу для всех треков.
+
+    :param X: состояния (T, 4)
+    :param P: ковариации (T, 4, 4)
+    :return: новые (X, P)
+    """
+    FT = np.ascontiguousarray(F.T)
+    X_new = np.empty_like(X)
+    P_new = np.empty_like(P)
+    for t in range(X.shape[0]):
+        X_new[t] = F @ X[t]
+        P_new[t] = F @ P[t] @ FT + Q
+    return X_new, P_new
+
+
+@njit(cache=True)
+def kf_update(X: np.ndarray, P: np.ndarray, Z: np.ndarray, R: np.ndarray, H: np.ndarray):
+    """
+    Шаг update фильтра Калмана (форма Джозефа для P) сразу для нескольких треков.
+
+    :param X: состояния (M, 4)
+    :param P: ковариации (M, 4, 4)
+    :param Z: измерения (M, 2)
+    :return: новые (X, P)
+    """
+    HT = np.ascontiguousarray(H.T)
+    eye = np.eye(P.shape[-1])
+    X_new = np.empty_like(X)
+    P_new = np.empty_like(P)
+    for t in range(X.shape[0]):
+        y = Z[t] - H @ X[t]
+        PHT = P[t] @ HT
+        S = H @ PHT + R
+        K = PHT @ np.linalg.inv(S)
+        X_new[t] = X[t] + K @ y
+        I_KH = eye - K @ H
+        P_new[t] = I_KH @ P[t] @ np.ascontiguousarray(I_KH.T) + K @ R @ np.ascontiguousarray(K.T)
+    return X_new, P_new
+
+
+def _bbox_center(bbox: Tuple[int, int, int, int]) -> Tuple[float, float]:
+    x1, y1, x2, y2 = bbox
+    return (x1 + x2) / 2.0, (y1 + y2) / 2.0
 
 
 class Track:
-    """Одна траектория с фильтром Калмана."""
-    def __init__(self, bbox: Tuple[int, int, int, int], track_id: int):
+    """
+    Одна траектория. Состояние фильтра Калмана хранится в PeopleTracker
+    (строка с тем же индексом, что и трек в PeopleTracker.tracks).
+    """
+    def __init__(self, bbox: Tuple[int, int, int, int], track_id: int,
+                 conf: Optional[float] = None):
         self.id = track_id
-        x1, y1, x2, y2 = bbox
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-
-        # Состояние: [cx, cy, vx, vy]
-        self.kf = KalmanFilter(dim_x=4, dim_z=2)
-        self.kf.x = np.array([cx, cy, 0., 0.])
-        self.kf.F = np.array([[1., 0., 1., 0.],
-                              [0., 1., 0., 1.],
-                              [0., 0., 1., 0.],
-                              [0., 0., 0., 1.]])
-        self.kf.H = np.array([[1., 0., 0., 0.],
-                              [0., 1., 0., 0.]])
-        self.kf.P *= 100.0
-        self.kf.R *= 5.0
-        self.kf.Q *= 0.01
-
         self.bbox = bbox
+        # conf детекции, обновившей трек на текущем кадре (None, если кадр пропущен)
+        self.conf = conf
         self.missed_frames = 0
         self.hits = 1
 
-    def predict(self):
-        """Предсказание состояния."""
-        try:
-            self.kf.predict()
-        except Exception:
-            logging.exception("Ошибка Kalman predict для трека %s", self.id)
+    def update(self, bbox: Tuple[int, int, int, int], conf: Optional[float] = None):
+        """Отмечает сопоставление с детекцией на текущем кадре."""
+        self.bbox = bbox
+        self.conf = conf
+        self.missed_frames = 0
+        self.hits += 1
 
-    def update(self, bbox: Tuple[int, int, int, int]):
-        """Обновление состояния фильтра измерением центра bbox."""
-        x1, y1, x2, y2 = bbox
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-        try:
-            self.kf.update(np.array([cx, cy]))
-            self.bbox = bbox
-            self.missed_frames = 0
-            self.hits += 1
-        except Exception:
-            logging.exception("Ошибка Kalman update для трека %s", self.id)
+    def move_to(self, cx: float, cy: float):
+        """Сдвигает bbox (без изменения размера) так, чтобы его центр был в (cx, cy)."""
+        x1, y1, x2, y2 = self.bbox
+        bcx, bcy = _bbox_center(self.bbox)
+        dx = int(round(cx - bcx))
+        dy = int(round(cy - bcy))
+        self.bbox = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+
+    def miss(self):
+        """Отмечает кадр без сопоставленной детекции (в т.ч. кадр, где детектор не запускался)."""
+        self.missed_frames += 1
+        self.conf = None
 
 
 class PeopleTracker:
     """Коллекция треков + сопоставление детекций с треками."""
     def __init__(self, max_distance: float = 60.0, max_missed: int = 10):
         self.tracks: List[Track] = []
+        # Состояния фильтров Калмана, строка на трек
+        self.X = np.empty((0, 4))
+        self.P = np.empty((0, 4, 4))
         self.max_distance = max_distance
         self.max_missed = max_missed
-        global _TRACK_ID
-        _TRACK_ID = 1
+        # id следующего нового трека (у каждого трекера своя нумерация)
+        self._next_id = 1
 
     @staticmethod
-    def _distance(a: Tuple[float, float], b: Tuple[float, float]) -> float:
-        return math.hypot(a[0] - b[0], a[1] - b[1])
+    def _sq_distance_matrix(tr_centers: np.ndarray, det_centers: np.ndarray) -> np.ndarray:
+        """
+        Матрица квадратов евклидовых расстояний (T, D) между центрами треков и детекций.
+        Для сравнения с порогом корень не нужен: сравниваем с max_distance ** 2.
+        """
+        return np.square(tr_centers[:, None, :] - det_centers[None, :, :]).sum(axis=2)
+
+    def predict_only(self) -> List[Dict]:
+        """
+        Шаг трекера для кадра, на котором детектор не запускался:
+        только predict, bbox треков берутся из предсказанных центров,
+        а кадр засчитывается трекам как пропуск (conf сбрасывается, missed_frames растёт).
+
+        :return: список треков в формате update()
+        """
+        try:
+            self.X, self.P = kf_predict(self.X, self.P, _F, _Q)
+        except Exception:
+            logging.exception("Ошибка Kalman predict")
+        for tr, (cx, cy) in zip(self.tracks, self.X[:, :2]):
+            tr.miss()
+            tr.move_to(cx, cy)
+        self._remove_dead()
+        return self._results()
 
     def update(self, detections: List[Dict]) -> List[Dict]:
         """
@@ -89,63 +175,89 @@ class PeopleTracker:
             'class': str
         }
         """
-        global _TRACK_ID
         # 1) predict для всех треков
-        for tr in self.tracks:
-            tr.predict()
+        try:
+            self.X, self.P = kf_predict(self.X, self.P, _F, _Q)
+        except Exception:
+            logging.exception("Ошибка Kalman predict")
 
         # 2) подготовка центров
-        det_centers = [det["center"] for det in detections]
         det_bboxes = [det["bbox"] for det in detections]
-
         matched_det_idx = set()
-        matched_tr_idx = set()
-
-        # 3) простое жадное сопоставление по расстоянию
-        for ti, tr in enumerate(self.tracks):
-            tr_center = (tr.kf.x[0], tr.kf.x[1])
-            best_d = float("inf")
-            best_di = None
-            for di, dc in enumerate(det_centers):
-                if di in matched_det_idx:
-                    continue
-                d = self._distance((tr_center[0], tr_center[1]), (dc[0], dc[1]))
-                if d < best_d:
-                    best_d = d
-                    best_di = di
-            if best_di is not None and best_d <= self.max_distance:
-                # matched
-                tr.update(det_bboxes[best_di])
-                matched_det_idx.add(best_di)
-                matched_tr_idx.add(ti)
-            else:
-                tr.missed_frames += 1
+        matched_tr_idx: List[int] = []
+        matched_di: List[int] = []
+
+        # 3) простое жадное сопоставление по расстоянию: треки по порядку
+        #    берут ближайшую ещё не занятую детекцию
+        if self.tracks and detections:
+            det_centers = np.array([det["center"] for det in detections], dtype=float)
+            dists2 = self._sq_distance_matrix(self.X[:, :2], det_centers)
+            max_d2 = self.max_distance ** 2
+            det_taken = np.zeros(len(detections), dtype=bool)
+            for ti, tr in enumerate(self.tracks):
+                row = np.where(det_taken, np.inf, dists2[ti])
+                best_di = int(np.argmin(row))
+                if row[best_di] <= max_d2:
+                    # matched
+                    tr.update(det_bboxes[best_di], detections[best_di].get("conf"))
+                    det_taken[best_di] = True
+                    matched_det_idx.add(best_di)
+                    matched_tr_idx.append(ti)
+                    matched_di.append(best_di)
+                else:
+                    tr.miss()
+                    tr.move_to(*self.X[ti, :2])
+        else:
+            for tr, (cx, cy) in zip(self.tracks, self.X[:, :2]):
+                tr.miss()
+                tr.move_to(cx, cy)
+
+        # обновление фильтров matched треков одним вызовом
+        if matched_tr_idx:
+            rows = np.array(matched_tr_idx)
+            Z = np.array([_bbox_center(det_bboxes[di]) for di in matched_di])
+            try:
+                self.X[rows], self.P[rows] = kf_update(self.X[rows], self.P[rows], Z, _R, _H)
+            except Exception:
+                logging.exception("Ошибка Kalman update")
 
         # 4) create new tracks for unmatched detections
+        new_states = []
         for di, det in enumerate(detections):
             if di in matched_det_idx:
                 continue
-            track = Track(det["bbox"], _TRACK_ID)
-            _TRACK_ID += 1
+            track = Track(det["bbox"], self._next_id, det.get("conf"))
+            self._next_id += 1
             self.tracks.append(track)
+            cx, cy = _bbox_center(det["bbox"])
+            new_states.append((cx, cy, 0., 0.))
+        if new_states:
+            self.X = np.vstack([self.X, np.array(new_states)])
+            self.P = np.concatenate([self.P, np.repeat(_P0[None], len(new_states), axis=0)])
 
         # 5) remove dead tracks
-        self.tracks = [t for t in self.tracks if t.missed_frames <= self.max_missed]
+        self._remove_dead()
 
         # 6) prepare results list for drawing
+        return self._results()
+
+    def _remove_dead(self):
+        """Удаляет треки, не сопоставленные дольше max_missed кадров, вместе с их состояниями."""
+        alive = np.array([t.missed_frames <= self.max_missed for t in self.tracks], dtype=bool)
+        if not alive.all():
+            self.tracks = [t for t, keep in zip(self.tracks, alive) if keep]
+            self.X = self.X[alive]
+            self.P = self.P[alive]
+
+    def _results(self) -> List[Dict]:
+        """Список треков для отрисовки."""
         results = []
         for tr in self.tracks:
             results.append({
                 "id": tr.id,
                 "bbox": tuple(map(int, tr.bbox)),
-                "conf": None,
+                "conf": tr.conf,
                 "class": "person"
             })
-        # attach confidences if detections matched (optional)
-        # Простая логика: если трек был только что обновлён и есть соответствующая детекция, возьмём conf
-        for di, det in enumerate(detections):
-            for res in results:
-                if res["bbox"] == det["bbox"]:
-                    res["conf"] = det.get("conf", None)
 
         return results
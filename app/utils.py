@@ -1,11 +1,24 @@
 """
 Утилиты визуализации: отрисовка боксов, id, confidence.
 """
+from functools import lru_cache
 from typing import List, Dict, Tuple
 
 import cv2
 
 
+@lru_cache(maxsize=1024)
+def _track_color(tid: int) -> Tuple[int, int, int]:
+    """Постоянный цвет трека по его id."""
+    return (tid * 37) % 256, (tid * 73) % 256, (tid * 97) % 256
+
+
+@lru_cache(maxsize=1024)
+def _track_label(tid: int, cls: str) -> str:
+    """Неизменная часть подписи трека (без conf)."""
+    return f"ID:{tid} {cls}"
+
+
 def draw_tracked_boxes(frame, tracks: List[Dict]):
     """
     Рисует прямоугольники и подписи (id, класс, conf).
@@ -18,15 +31,15 @@ def draw_tracked_boxes(frame, tracks: List[Dict]):
         tid = tr.get("id", 0)
         cls = tr.get("class", "obj")
         conf = tr.get("conf", None)
-        label = f"ID:{tid} {cls}"
+        label = _track_label(tid, cls)
         if conf is not None:
             try:
                 label += f" {conf:.2f}"
             except Exception:
                 label += f" {conf}"
 
-        # Выбираем цвет на основании id (постоянный)
-        color = ((tid * 37) % 256, (tid * 73) % 256, (tid * 97) % 256)
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        # Выбираем цвет на основании id (постоянный); LINE_4 растеризуется дешевле LINE_8 по умолчанию
+        color = _track_color(tid)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2, cv2.LINE_4)
         cv2.putText(frame, label, (x1, max(y1 - 10, 10)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
\ No newline at end of file
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2, cv2.LINE_4)
\ No newline at end of file
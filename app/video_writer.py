@@ -0,0 +1,102 @@
+"""
+Запись видео в H.264 через ffmpeg: кадры BGR передаются в stdin процесса ffmpeg.
+
+Кодировщик выбирается проверкой (encoder_available): аппаратный NVENC (h264_nvenc),
+если ffmpeg собран с ним и драйвер его предоставляет, иначе libx264.
+Интерфейс совпадает с cv2.VideoWriter (write/isOpened/release).
+"""
+import logging
+import shutil
+import subprocess
+from functools import lru_cache
+from typing import Optional
+
+# Размер буфера канала в ffmpeg
+PIPE_BUFSIZE = 1 << 20
+# Сколько ждать пробного кодирования одного кадра
+PROBE_TIMEOUT = 15
+
+
+@lru_cache(maxsize=None)
+def encoder_available(codec: str) -> bool:
+    """
+    Проверяет, что ffmpeg может кодировать кодеком codec: кодирует один тестовый кадр.
+
+    С rawvideo на stdin ffmpeg открывает кодировщик только на первом кадре,
+    поэтому без такой проверки отказ NVENC обнаружился бы уже во время записи.
+    Результат кэшируется: видео обрабатываются параллельно одним процессом.
+    """
+    if shutil.which("ffmpeg") is None:
+        return False
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "nullsrc=s=256x256",
+        "-frames:v", "1", "-c:v", codec, "-pix_fmt", "yuv420p",
+        "-f", "null", "-",
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                timeout=PROBE_TIMEOUT)
+    except Exception:
+        logging.exception("Ошибка проверки кодировщика %s", codec)
+        return False
+    return result.returncode == 0
+
+
+class FFmpegVideoWriter:
+    """Писатель видео, кодирующий кадры внешним процессом ffmpeg."""
+
+    def __init__(self, output_path: str, fps: float, width: int, height: int,
+                 codec: str = "h264_nvenc", preset: Optional[str] = None):
+        """
+        Запускает процесс ffmpeg.
+
+        :param output_path: путь к выходному файлу
+        :param codec: кодировщик ffmpeg (h264_nvenc, libx264, ...)
+        :param preset: пресет кодировщика; по умолчанию самый быстрый для codec
+        """
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg не найден в PATH.")
+        if preset is None:
+            preset = "p1" if codec.endswith("_nvenc") else "ultrafast"
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-",
+            # yuv420p требует чётных сторон: нечётный кадр дополняем на пиксель
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", codec, "-preset", preset,
+            "-pix_fmt", "yuv420p",
+            output_path,
+        ]
+        self.output_path = output_path
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, bufsize=PIPE_BUFSIZE)
+        # ffmpeg завершился во время записи — дальнейшие кадры отбрасываются
+        self._broken = False
+
+    def isOpened(self) -> bool:
+        """True, пока процесс ffmpeg жив."""
+        return not self._broken and self.proc.poll() is None
+
+    def write(self, frame) -> None:
+        """Передаёт кадр BGR (numpy array размера width x height) в ffmpeg."""
+        if self._broken:
+            return
+        try:
+            self.proc.stdin.write(frame.tobytes())
+        except (BrokenPipeError, OSError):
+            self._broken = True
+            logging.error("ffmpeg завершился во время записи %s (код %s), остальные кадры не записаны.",
+                          self.output_path, self.proc.poll())
+
+    def release(self) -> None:
+        """Закрывает вход ffmpeg и дожидается завершения кодирования."""
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            # процесс уже завершился, об этом сообщили в write()
+            pass
+        code = self.proc.wait()
+        if code != 0:
+            logging.error("ffmpeg завершился с кодом %d для %s", code, self.output_path)